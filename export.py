@@ -0,0 +1,82 @@
+import argparse
+import json
+
+import torch
+
+from model import WaveGrad
+from utils import ConfigWrapper, show_message, load_latest_checkpoint
+
+
+def export_onnx(model, config, onnx_path, opset_version=17):
+    """
+    Exports backbone network of WaveGrad to ONNX with dynamic batch and time axes.
+    The result can be converted to TensorRT engine by `trtexec` with shape profile of dynamic axes
+    (see `build_trtexec_command`) and used for inference by `model.trt.TRTWaveGrad`.
+    """
+    device = next(model.parameters()).device
+    mel_segment_length = config.training_config.segment_length//config.data_config.hop_length
+    mels = torch.randn(1, config.data_config.n_mels, mel_segment_length, device=device)
+    yn = torch.randn(1, config.training_config.segment_length, device=device)
+    noise_level = torch.rand(1, 1, device=device)
+    with torch.no_grad():
+        torch.onnx.export(
+            model.nn, (mels, yn, noise_level), onnx_path,
+            input_names=['mels', 'yn', 'noise_level'],
+            output_names=['eps'],
+            dynamic_axes={
+                'mels': {0: 'batch', 2: 'frames'},
+                'yn': {0: 'batch', 1: 'samples'},
+                'noise_level': {0: 'batch'},
+                'eps': {0: 'batch', 1: 'samples'}
+            },
+            opset_version=opset_version
+        )
+
+
+def build_trtexec_command(config, onnx_path, engine_path='wavegrad.engine', max_batch_size=32):
+    """
+    Builds `trtexec` command converting exported ONNX to FP16 TensorRT engine. Without explicit shapes
+    trtexec fixes every dynamic axis to 1, so the profile covers inputs of `sample_subregions_parallel`:
+    up to `max_batch_size` splits of at most `segment_length` samples (`segment_length//hop_length` frames).
+    """
+    n_mels = config.data_config.n_mels
+    hop_length = config.data_config.hop_length
+    mel_segment_length = config.training_config.segment_length//hop_length
+
+    def shapes(batch_size, n_frames):
+        return ','.join([
+            f'mels:{batch_size}x{n_mels}x{n_frames}',
+            f'yn:{batch_size}x{n_frames*hop_length}',
+            f'noise_level:{batch_size}x1'
+        ])
+
+    return ' '.join([
+        'trtexec',
+        f'--onnx={onnx_path}',
+        f'--saveEngine={engine_path}',
+        '--fp16',
+        f'--minShapes={shapes(1, 1)}',
+        f'--optShapes={shapes(max_batch_size, mel_segment_length)}',
+        f'--maxShapes={shapes(max_batch_size, mel_segment_length)}'
+    ])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--config', required=True, type=str)
+    parser.add_argument('-o', '--onnx_path', required=False, default='wavegrad_nn.onnx', type=str)
+    parser.add_argument('-b', '--max_batch_size', required=False, default=32, type=int)
+    parser.add_argument('-v', '--verbose', required=False, default=True, type=bool)
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = ConfigWrapper(**json.load(f))
+
+    show_message('Loading latest checkpoint...', verbose=args.verbose)
+    model, _, _ = load_latest_checkpoint(config.training_config.logdir, WaveGrad(config))
+    model.eval()
+
+    show_message(f'Exporting backbone network to {args.onnx_path}...', verbose=args.verbose)
+    export_onnx(model, config, args.onnx_path)
+    trtexec_command = build_trtexec_command(config, args.onnx_path, max_batch_size=args.max_batch_size)
+    show_message(f'Done. Build TensorRT engine by `{trtexec_command}`.', verbose=args.verbose)
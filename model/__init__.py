@@ -1 +1,2 @@
 from .diffusion_process import WaveGrad
+from .streaming import WaveGradStreamer
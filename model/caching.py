@@ -0,0 +1,49 @@
+import math
+
+
+class TaylorSeerCache(object):
+    """
+    Caches noise predictions of the backbone network along reverse process trajectory and forecasts them
+    on skipped iterations by Taylor expansion over finite differences of cached predictions
+    (TaylorSeer, link: https://arxiv.org/pdf/2503.06923.pdf).
+    Full network evaluation is run on the first `warmup` iterations and then on every `interval`-th one.
+    """
+    def __init__(self, order=1, interval=2, warmup=3):
+        assert order >= 0 and interval >= 1 and warmup >= 1, \
+            """Caching requires non-negative order, positive interval and at least one warmup iteration."""
+        self.order = order
+        self.interval = interval
+        self.warmup = warmup
+        self.reset()
+
+    def reset(self):
+        self.n_steps = 0
+        self.last_t = None
+        self.derivatives = []
+
+    def is_full_step(self):
+        return self.n_steps < self.warmup or (self.n_steps - self.warmup) % self.interval == 0
+
+    def update(self, t, eps_recon):
+        """
+        Stores network prediction at timestep `t` and refreshes finite differences up to `order`.
+        """
+        derivatives = [eps_recon]
+        if not isinstance(self.last_t, type(None)):
+            distance = self.last_t - t
+            for i in range(min(self.order, len(self.derivatives))):
+                derivatives.append((derivatives[i] - self.derivatives[i]) / distance)
+        self.derivatives = derivatives
+        self.last_t = t
+        self.n_steps += 1
+
+    def forecast(self, t):
+        """
+        Predicts network output at timestep `t` from the last full evaluation.
+        """
+        k = self.last_t - t
+        outputs = self.derivatives[0]
+        for i, derivative in enumerate(self.derivatives[1:], start=1):
+            outputs = outputs + derivative * (k**i / math.factorial(i))
+        self.n_steps += 1
+        return outputs
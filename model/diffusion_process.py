@@ -1,9 +1,39 @@
-import numpy as np
+import math
+from collections import OrderedDict
 
 import torch
 
 from model.base import BaseModule
 from model.nn import WaveGradNN
+from model.caching import TaylorSeerCache
+
+
+# Columns of reverse process coefficients table, which is indexed by timestep on every iteration
+REVERSE_COEFFICIENTS = [
+    'sqrt_alphas_cumprod',
+    'sqrt_recip_alphas_cumprod',
+    'sqrt_recipm1_alphas_cumprod',
+    'posterior_log_variance_clipped',
+    'posterior_mean_coef1',
+    'posterior_mean_coef2'
+]
+
+
+def pack_reverse_coefficients(**coefficients):
+    # Stacks 1-D coefficients into [n_steps, len(REVERSE_COEFFICIENTS)] table in the order of columns list
+    return torch.stack([coefficients[name] for name in REVERSE_COEFFICIENTS], dim=1)
+
+
+def unpack_reverse_coefficients(coefficients_t):
+    # Splits a row of reverse coefficients table into a dict of scalar tensors by column names
+    return dict(zip(REVERSE_COEFFICIENTS, coefficients_t.unbind()))
+
+
+@torch.jit.script
+def _q_sample(continious_sqrt_alpha_cumprod: torch.Tensor, y_0: torch.Tensor, eps: torch.Tensor) -> torch.Tensor:
+    # y_n = sqrt(alpha_cumprod) * y_0 + sqrt(1 - alpha_cumprod) * eps, scripted for elementwise ops fusion
+    noise_scale = torch.sqrt(1.0 - continious_sqrt_alpha_cumprod * continious_sqrt_alpha_cumprod)
+    return continious_sqrt_alpha_cumprod * y_0 + noise_scale * eps
 
 
 class WaveGrad(BaseModule):
@@ -19,17 +49,24 @@ class WaveGrad(BaseModule):
           More details in `sample_subregions_parallel` method docs.
           Also it is set as default `forward` model method.
     """
-    def __init__(self, config):
+    def __init__(self, config, nn=None):
+        """
+        :param config (ConfigWrapper): model, data and training configuration
+        :param nn (torch.nn.Module, optional): backbone network to use instead of building `WaveGradNN`
+        """
         super(WaveGrad, self).__init__()
         self.n_iter = config.model_config.noise_schedule.n_iter
         self.betas_range = config.model_config.noise_schedule.betas_range
         self.mel_segment_length = config.training_config.segment_length//config.data_config.hop_length
+        # Number of noise levels every training sample is diffused with in a single step
+        self.n_noise_levels_per_sample = config.training_config.n_noise_levels_per_sample \
+            if 'n_noise_levels_per_sample' in config.training_config else 1
 
         betas = torch.linspace(self.betas_range[0], self.betas_range[1], steps=self.n_iter)
         alphas = 1 - betas
         alphas_cumprod = alphas.cumprod(dim=0)
-        alphas_cumprod_prev = torch.cat([torch.FloatTensor([1]), alphas_cumprod[:-1]])
-        alphas_cumprod_prev_with_last = torch.cat([torch.FloatTensor([1]), alphas_cumprod])
+        alphas_cumprod_prev = torch.cat([betas.new_ones(1), alphas_cumprod[:-1]])
+        alphas_cumprod_prev_with_last = torch.cat([betas.new_ones(1), alphas_cumprod])
         self.register_buffer('betas', betas)
         self.register_buffer('alphas', alphas)
         self.register_buffer('alphas_cumprod', alphas_cumprod)
@@ -38,7 +75,9 @@ class WaveGrad(BaseModule):
         # Calculations for posterior q(y_n|y_0)
         sqrt_alphas_cumprod = alphas_cumprod.sqrt()
         # For WaveGrad special continiout noise level conditioning
-        self.sqrt_alphas_cumprod_prev = alphas_cumprod_prev_with_last.sqrt().numpy()
+        self.register_buffer(
+            'sqrt_alphas_cumprod_prev_t', alphas_cumprod_prev_with_last.sqrt(), persistent=False
+        )
         sqrt_recip_alphas_cumprod = (1 / alphas_cumprod).sqrt()
         sqrt_recipm1_alphas_cumprod = (1 / alphas_cumprod - 1).sqrt()
         self.register_buffer('sqrt_alphas_cumprod', sqrt_alphas_cumprod)
@@ -47,8 +86,7 @@ class WaveGrad(BaseModule):
 
         # Calculations for posterior q(y_{t-1} | y_t, y_0)
         posterior_variance = betas * (1 - alphas_cumprod_prev) / (1 - alphas_cumprod)
-        posterior_variance = torch.stack([posterior_variance, torch.FloatTensor([1e-20] * self.n_iter)])
-        posterior_log_variance_clipped = posterior_variance.max(dim=0).values.log()
+        posterior_log_variance_clipped = posterior_variance.clamp_min(1e-20).log()
         # below: log calculation clipped because the posterior variance is 0 at the beginning of the diffusion chain
         posterior_mean_coef1 = betas * alphas_cumprod_prev.sqrt() / (1 - alphas_cumprod)
         posterior_mean_coef2 = (1 - alphas_cumprod_prev) * alphas.sqrt() / (1 - alphas_cumprod)
@@ -56,26 +94,49 @@ class WaveGrad(BaseModule):
         self.register_buffer('posterior_mean_coef1', posterior_mean_coef1)
         self.register_buffer('posterior_mean_coef2', posterior_mean_coef2)
 
+        # All the coefficients of a reverse iteration packed into a single row of [n_iter, 6] table,
+        # columns follow `REVERSE_COEFFICIENTS`
+        self.register_buffer('reverse_coefficients', pack_reverse_coefficients(
+            sqrt_alphas_cumprod=sqrt_alphas_cumprod,
+            sqrt_recip_alphas_cumprod=sqrt_recip_alphas_cumprod,
+            sqrt_recipm1_alphas_cumprod=sqrt_recipm1_alphas_cumprod,
+            posterior_log_variance_clipped=posterior_log_variance_clipped,
+            posterior_mean_coef1=posterior_mean_coef1,
+            posterior_mean_coef2=posterior_mean_coef2
+        ), persistent=False)
+
         # Backbone neural network to model noise
-        self.total_factor = np.product(config.model_config.factors)
+        self.total_factor = math.prod(config.model_config.factors)
         assert self.total_factor == config.data_config.hop_length, \
             """Total factor-product should be equal to the hop length of STFT. Other cases have not been tested yet."""
-        self.n_iter = config.model_config.noise_schedule.n_iter
-        self.nn = WaveGradNN(config)
+        self.nn = WaveGradNN(config) if isinstance(nn, type(None)) else nn
+
+        # Optional reuse of network predictions between adjacent reverse iterations
+        self.caching_config = config.model_config.caching \
+            if 'caching' in config.model_config else None
+        # Run backbone network in bfloat16 during sampling (on supported GPUs only)
+        self.mixed_precision_inference = config.model_config.mixed_precision_inference \
+            if 'mixed_precision_inference' in config.model_config else True
+        # Compile reverse iteration with `torch.compile` for sampling (requires PyTorch 2.0+)
+        self.compile_sampling = config.model_config.compile_sampling \
+            if 'compile_sampling' in config.model_config else False
+        self._compiled_reverse_step = None
+        # Cached strided reverse schedules and captured CUDA graphs of sampling
+        self._strided_coefficients = {}
+        self._cuda_graphs = OrderedDict()
+        # Every captured graph pins its own memory pool, so only a few most recently used ones are kept
+        self.max_cuda_graphs = 2
 
     def sample_continious_noise_level(self, batch_size, device):
         """
         Samples continious noise level sqrt(alpha_cumprod).
         This is what makes WaveGrad different from other Denoising Diffusion Probabilistic Models.
         """
-        s = np.random.choice(range(1, self.n_iter + 1), size=batch_size)
-        continious_sqrt_alpha_cumprod = torch.FloatTensor(
-            np.random.uniform(
-                self.sqrt_alphas_cumprod_prev[s-1],
-                self.sqrt_alphas_cumprod_prev[s],
-                size=batch_size
-            )
-        ).to(device)
+        s = torch.randint(1, self.n_iter + 1, size=(batch_size,), device=device)
+        low = self.sqrt_alphas_cumprod_prev_t[s-1]
+        high = self.sqrt_alphas_cumprod_prev_t[s]
+        u = torch.rand(batch_size, device=device)
+        continious_sqrt_alpha_cumprod = low + u * (high - low)
         return continious_sqrt_alpha_cumprod.unsqueeze(-1)
     
     def q_sample(self, y_0, continious_sqrt_alpha_cumprod=None, eps=None):
@@ -85,61 +146,288 @@ class WaveGrad(BaseModule):
                 if isinstance(eps, type(None)) else continious_sqrt_alpha_cumprod
         if isinstance(eps, type(None)):
             eps = torch.randn_like(y_0)
-        outputs = continious_sqrt_alpha_cumprod * y_0 + (1 - continious_sqrt_alpha_cumprod**2) * eps
+        outputs = _q_sample(continious_sqrt_alpha_cumprod, y_0, eps)
         return outputs
 
-    def q_posterior(self, y_start, y, t):
-        posterior_mean = self.posterior_mean_coef1[t] * y_start + self.posterior_mean_coef2[t] * y
-        posterior_log_variance_clipped = self.posterior_log_variance_clipped[t]
-        return posterior_mean, posterior_log_variance_clipped
+    def get_reverse_coefficients(self, num_inference_steps=None, schedule='quadratic'):
+        """
+        Builds coefficients of reverse process indexed by reverse iteration number.
+        If `num_inference_steps` is less than `n_iter`, reverse process is run over a subset of training
+        timesteps with posterior recomputed for the strided chain (no retraining needed thanks to
+        continious noise level conditioning).
+        :param num_inference_steps (int, optional): number of reverse iterations, defaults to `n_iter`
+        :param schedule (str, optional): timesteps spacing, `linear` or `quadratic` (denser at low noise levels)
+        :return (torch.Tensor): coefficients of shape [num_inference_steps, len(REVERSE_COEFFICIENTS)]
+        """
+        if isinstance(num_inference_steps, type(None)) or num_inference_steps >= self.n_iter:
+            return self.reverse_coefficients
+        if num_inference_steps < 1:
+            raise ValueError(f'Number of inference steps should be positive, got {num_inference_steps}.')
+        # Building a schedule involves host-device copies, which are not allowed during CUDA graph capture
+        key = (num_inference_steps, schedule, self.alphas_cumprod.device)
+        if key not in self._strided_coefficients:
+            self._strided_coefficients[key] = self._build_strided_coefficients(num_inference_steps, schedule)
+        return self._strided_coefficients[key]
 
-    def predict_start_from_noise(self, y, t, eps):
-        return self.sqrt_recip_alphas_cumprod[t] * y - self.sqrt_recipm1_alphas_cumprod[t] * eps
+    def _build_strided_coefficients(self, num_inference_steps, schedule):
+        if schedule not in ['linear', 'quadratic']:
+            raise ValueError(f'Unknown reverse timesteps schedule `{schedule}`.')
+        if num_inference_steps == 1:
+            # Single iteration should denoise from the noisiest level, while spacings below start from 0
+            timesteps = torch.FloatTensor([self.n_iter - 1])
+        elif schedule == 'linear':
+            timesteps = torch.linspace(0, self.n_iter - 1, num_inference_steps)
+        else:
+            timesteps = torch.linspace(0, math.sqrt(self.n_iter - 1), num_inference_steps)**2
+        # Rounding might merge neighbouring timesteps (mostly where quadratic spacing is dense),
+        # so they are spread to be strictly increasing within [0, n_iter - 1] to keep the requested count
+        steps = torch.arange(num_inference_steps)
+        timesteps = (timesteps.round().long() - steps).cummax(dim=0).values + steps
+        timesteps = torch.minimum(timesteps, steps + self.n_iter - num_inference_steps)
+        timesteps = timesteps.to(self.alphas_cumprod.device)
+
+        alphas_cumprod = self.alphas_cumprod[timesteps]
+        alphas_cumprod_prev = torch.cat([alphas_cumprod.new_ones(1), alphas_cumprod[:-1]])
+        betas = 1 - alphas_cumprod / alphas_cumprod_prev
+        posterior_variance = betas * (1 - alphas_cumprod_prev) / (1 - alphas_cumprod)
+        return pack_reverse_coefficients(
+            sqrt_alphas_cumprod=alphas_cumprod.sqrt(),
+            sqrt_recip_alphas_cumprod=(1 / alphas_cumprod).sqrt(),
+            sqrt_recipm1_alphas_cumprod=(1 / alphas_cumprod - 1).sqrt(),
+            posterior_log_variance_clipped=posterior_variance.clamp_min(1e-20).log(),
+            posterior_mean_coef1=betas * alphas_cumprod_prev.sqrt() / (1 - alphas_cumprod),
+            posterior_mean_coef2=(1 - alphas_cumprod_prev) * (1 - betas).sqrt() / (1 - alphas_cumprod)
+        )
 
-    def p_mean_variance(self, mels, y, t, clip_denoised: bool):
+    def q_posterior(self, y_start, y, c):
+        posterior_mean = torch.addcmul(c['posterior_mean_coef2'] * y, c['posterior_mean_coef1'], y_start)
+        return posterior_mean, c['posterior_log_variance_clipped']
+
+    def predict_start_from_noise(self, y, eps, c):
+        return torch.addcmul(c['sqrt_recip_alphas_cumprod'] * y, -c['sqrt_recipm1_alphas_cumprod'], eps)
+
+    def p_mean_variance(self, mels, y, t, clip_denoised: bool, coefficients=None, cache=None):
+        coefficients = self.get_reverse_coefficients() if isinstance(coefficients, type(None)) else coefficients
+        # Single gather of all the coefficients of current iteration, `t` stays on device to avoid host syncs
+        t = torch.as_tensor(t, device=coefficients.device)
+        c = unpack_reverse_coefficients(torch.index_select(coefficients, 0, t.view(1)).squeeze(0))
         batch_size = mels.shape[0]
-        noise_level = torch.FloatTensor([self.sqrt_alphas_cumprod_prev[t]]).repeat(batch_size, 1).to(mels)
-        eps_recon = self.nn(mels, y, noise_level)
-        y_recon = self.predict_start_from_noise(y, t, eps_recon)
+        noise_level = c['sqrt_alphas_cumprod'].view(1, 1).expand(batch_size, 1)
+        if isinstance(cache, type(None)) or cache.is_full_step():
+            # Posterior computations are kept in float32 to preserve stability of the chain
+            eps_recon = self.nn(mels, y, noise_level).float()
+            if not isinstance(cache, type(None)):
+                cache.update(t, eps_recon)
+        else:
+            eps_recon = cache.forecast(t)
+        y_recon = self.predict_start_from_noise(y, eps_recon, c)
 
         if clip_denoised:
             y_recon.clamp_(-1.0, 1.0)
         
-        model_mean, posterior_log_variance = self.q_posterior(y_start=y_recon, y=y, t=t)
+        model_mean, posterior_log_variance = self.q_posterior(y_start=y_recon, y=y, c=c)
         return model_mean, posterior_log_variance
 
-    def compute_inverse_dynamics(self, mels, y, t, clip_denoised=True):
+    def compute_inverse_dynamics(self, mels, y, t, clip_denoised=True, coefficients=None, cache=None, noise=None):
         """
         Computes Langevin inverse dynamics.
         :param mels (torch.Tensor): mel-spectrograms acoustic features of shape [B, n_mels, T//hop_length]
         :param y (torch.Tensor): previous state from dynamics trajectory
+        :param t (int or torch.Tensor): reverse iteration index
         :param clip_denoised (bool, optional): clip signal to [-1, 1]
+        :param coefficients (torch.Tensor, optional): reverse process coefficients from `get_reverse_coefficients`
+        :param cache (TaylorSeerCache, optional): cache to forecast network predictions with on skipped iterations
+        :param noise (torch.Tensor, optional): preallocated buffer of the shape of `y` to be refilled with noise
         :return (torch.Tensor): next state
         """
-        model_mean, model_log_variance = self.p_mean_variance(mels, y, t, clip_denoised)
-        eps = torch.randn_like(y) if t > 0 else torch.zeros_like(y)
-        return model_mean + eps * (0.5 * model_log_variance).exp()
+        model_mean, model_log_variance = self.p_mean_variance(mels, y, t, clip_denoised, coefficients, cache)
+        # No noise is added on the last iteration; masking the scale keeps this step free of branching on `t`
+        eps = torch.randn_like(y) if isinstance(noise, type(None)) else noise.normal_()
+        return torch.addcmul(model_mean, eps, (0.5 * model_log_variance).exp() * (t > 0))
 
-    def sample(self, mels, store_intermediate_states=False):
+    @property
+    def compiled_reverse_step(self):
+        """
+        `compute_inverse_dynamics` compiled with `torch.compile`. Inductor fuses the posterior elementwise tail
+        with the network epilogue and CUDA graphs remove kernels launch overhead of every iteration.
+        """
+        if isinstance(self._compiled_reverse_step, type(None)):
+            self._compiled_reverse_step = torch.compile(
+                self.compute_inverse_dynamics, mode='reduce-overhead', fullgraph=False
+            )
+        return self._compiled_reverse_step
+
+    def _use_mixed_precision(self, device):
+        # Native bfloat16 is available since Ampere; the check is a pure query, so it is safe in graph capture
+        return self.mixed_precision_inference \
+            and device.type == 'cuda' and torch.cuda.get_device_capability(device)[0] >= 8
+
+    def _build_cache(self):
+        return TaylorSeerCache(**self.caching_config) \
+            if not isinstance(self.caching_config, type(None)) else None
+
+    def sample(self, mels, store_intermediate_states=False, num_inference_steps=None, schedule='quadratic'):
         """
         Generation from mel-spectrograms.
         :param mels (torch.Tensor): mel-spectrograms acoustic features of shape [B, n_mels, T//hop_length]
         :param store_intermediate_states (bool, optional): whether to store dynamics trajectory or not
-        :return ys (list of torch.Tensor) (if store_intermediate_states=True)
+        :param num_inference_steps (int, optional): number of reverse iterations to skip steps with, defaults to `n_iter`
+        :param schedule (str, optional): reverse timesteps spacing when skipping steps, `linear` or `quadratic`
+        :return ys (torch.Tensor) of shape [num_inference_steps + 1, B, T] (if store_intermediate_states=True)
             or y_0 (torch.Tensor): predicted signals on every dynamics iteration of shape [B, T]
         """
-        with torch.no_grad():
-            device = next(self.parameters()).device
+        device = mels.device
+        with torch.inference_mode(), torch.autocast(
+                device_type=device.type, dtype=torch.bfloat16, enabled=self._use_mixed_precision(device)):
             batch_size, T = mels.shape[0], mels.shape[-1]
-            ys = [torch.randn(batch_size, T*self.total_factor, dtype=torch.float32).to(device)]
-            t = self.n_iter - 1
-            while t >= 0:
-                y_t = self.compute_inverse_dynamics(mels, y=ys[-1], t=t)
-                ys.append(y_t)
-                t -= 1
-            return ys if store_intermediate_states else ys[-1]
+            coefficients = self.get_reverse_coefficients(num_inference_steps, schedule)
+            n_steps = coefficients.shape[0]
+            cache = self._build_cache()
+            y_t = torch.randn(batch_size, T*self.total_factor, dtype=torch.float32, device=device)
+            if store_intermediate_states:
+                ys = torch.empty((n_steps + 1, *y_t.shape), dtype=y_t.dtype, device=device)
+                ys[0] = y_t
+            # Caching keeps Python-side state between iterations, so it is run eagerly
+            use_compiled = self.compile_sampling and isinstance(cache, type(None))
+            reverse_step = self.compiled_reverse_step if use_compiled else self.compute_inverse_dynamics
+
+            # Timesteps are kept as device tensors, so that coefficients are gathered without host syncs
+            # and compiled graph is the same for every iteration
+            timesteps = torch.arange(n_steps - 1, -1, -1, device=device)
+            # Compiled graph manages its own memory, while eager iterations reuse a single noise buffer
+            noise = None if use_compiled else torch.empty_like(y_t)
+            for i, t in enumerate(timesteps):
+                if use_compiled:
+                    torch.compiler.cudagraph_mark_step_begin()
+                # Only the latest state is referenced, so previous ones are freed right away
+                y_t = reverse_step(mels, y=y_t, t=t, coefficients=coefficients, cache=cache, noise=noise)
+                if use_compiled:
+                    # Outputs of CUDA graphs are released when the next step begins, so they are copied out
+                    y_t = y_t.clone()
+                if store_intermediate_states:
+                    ys[i + 1] = y_t
+            return ys if store_intermediate_states else y_t
 
-    def sample_subregions_parallel(self, mels, store_intermediate_states=False):
+    def sample_in_streams(self, mels, max_batch_size, store_intermediate_states=False,
+                          num_inference_steps=None, schedule='quadratic'):
+        """
+        Generation from mel-spectrograms, which are processed by chunks of at most `max_batch_size` along
+        batch dimension to limit memory usage. On GPU every reverse iteration is issued for all the chunks
+        in turn, alternating them between two CUDA streams, so that network pass of one chunk overlaps with
+        posterior computations of the previous one. Thus, network activations of two chunks might be alive
+        at once, i.e. peak memory corresponds to about `2*max_batch_size` samples (plus all chunks states).
+        Iterations are run eagerly (`compile_sampling` is not applied).
+        :param mels (torch.Tensor): mel-spectrograms acoustic features of shape [B, n_mels, T//hop_length]
+        :param max_batch_size (int): maximum number of samples in a single network pass
+        :param store_intermediate_states (bool, optional): whether to store dynamics trajectory or not
+        :param num_inference_steps (int, optional): number of reverse iterations, see `sample` method
+        :param schedule (str, optional): reverse timesteps spacing, see `sample` method
+        :return: same as `sample` method
+        """
+        chunks = mels.split(max_batch_size, dim=0)
+        if mels.device.type != 'cuda':
+            return torch.cat([
+                self.sample(chunk, store_intermediate_states, num_inference_steps, schedule) for chunk in chunks
+            ], dim=-2)
+
+        device = mels.device
+        with torch.inference_mode(), torch.autocast(
+                device_type=device.type, dtype=torch.bfloat16, enabled=self._use_mixed_precision(device)):
+            coefficients = self.get_reverse_coefficients(num_inference_steps, schedule)
+            n_steps = coefficients.shape[0]
+            timesteps = torch.arange(n_steps - 1, -1, -1, device=device)
+            caches = [self._build_cache() for _ in chunks]
+
+            # Every chunk stays on the same stream, so its iterations are ordered by the stream itself
+            current_stream = torch.cuda.current_stream(device)
+            streams = [torch.cuda.Stream(device) for _ in range(2)]
+            for stream in streams:
+                stream.wait_stream(current_stream)
+
+            # Chunks states are allocated on their own streams to be safely reused by the allocator
+            y_ts, noises, ys = [], [], []
+            for k, chunk in enumerate(chunks):
+                with torch.cuda.stream(streams[k % len(streams)]):
+                    y_t = torch.randn(
+                        chunk.shape[0], chunk.shape[-1]*self.total_factor, dtype=torch.float32, device=device
+                    )
+                    y_ts.append(y_t)
+                    noises.append(torch.empty_like(y_t))
+                    if store_intermediate_states:
+                        ys.append(torch.empty((n_steps + 1, *y_t.shape), dtype=y_t.dtype, device=device))
+                        ys[k][0] = y_t
+
+            for i, t in enumerate(timesteps):
+                for k, chunk in enumerate(chunks):
+                    with torch.cuda.stream(streams[k % len(streams)]):
+                        y_ts[k] = self.compute_inverse_dynamics(
+                            chunk, y=y_ts[k], t=t, coefficients=coefficients, cache=caches[k], noise=noises[k]
+                        )
+                        if store_intermediate_states:
+                            ys[k][i + 1] = y_ts[k]
+            for stream in streams:
+                current_stream.wait_stream(stream)
+
+            recons = ys if store_intermediate_states else y_ts
+            for outputs in recons:
+                # Outputs were allocated on side streams, but are consumed on the current one
+                outputs.record_stream(current_stream)
+            return torch.cat(recons, dim=-2)
+
+    def sample_graphed(self, mels, num_inference_steps=None, schedule='quadratic', n_warmup_iters=3):
+        """
+        Generation from mel-spectrograms with the whole reverse process captured into a single CUDA graph,
+        which is replayed instead of launching kernels of every iteration one by one.
+        Graphs are cached by input shape and sampling settings. Every new shape costs warmup runs and capture,
+        and only `max_cuda_graphs` most recently used graphs are kept, so it pays off only when inputs
+        shape is fixed (like fixed-length utterances split by `sample_subregions_parallel`), not on
+        a filelist of arbitrary lengths.
+        :param mels (torch.Tensor): mel-spectrograms acoustic features of shape [B, n_mels, T//hop_length] on GPU
+        :param num_inference_steps (int, optional): number of reverse iterations, see `sample` method
+        :param schedule (str, optional): reverse timesteps spacing, see `sample` method
+        :param n_warmup_iters (int, optional): number of eager sampling runs before graph capture
+        :return y_0 (torch.Tensor): predicted signals of shape [B, T]
+        """
+        assert mels.device.type == 'cuda', \
+            """CUDA graphs sampling requires inputs on GPU."""
+        assert not self.compile_sampling, \
+            """CUDA graphs sampling captures eager iterations, disable `compile_sampling` to use it."""
+        sampling_kwargs = {'num_inference_steps': num_inference_steps, 'schedule': schedule}
+        caching_key = None if isinstance(self.caching_config, type(None)) \
+            else tuple(sorted(self.caching_config.items()))
+        key = (
+            tuple(mels.shape), mels.device, num_inference_steps, schedule,
+            caching_key, self.mixed_precision_inference
+        )
+        with torch.inference_mode():
+            if key in self._cuda_graphs:
+                self._cuda_graphs.move_to_end(key)
+            else:
+                while len(self._cuda_graphs) >= self.max_cuda_graphs:
+                    self._cuda_graphs.popitem(last=False)
+                static_mels = mels.clone()
+                current_stream = torch.cuda.current_stream(mels.device)
+                stream = torch.cuda.Stream(mels.device)
+                stream.wait_stream(current_stream)
+                with torch.cuda.stream(stream):
+                    for _ in range(n_warmup_iters):
+                        self.sample(static_mels, **sampling_kwargs)
+                current_stream.wait_stream(stream)
+
+                graph = torch.cuda.CUDAGraph()
+                with torch.cuda.graph(graph):
+                    static_outputs = self.sample(static_mels, **sampling_kwargs)
+                self._cuda_graphs[key] = (graph, static_mels, static_outputs)
+
+            graph, static_mels, static_outputs = self._cuda_graphs[key]
+            static_mels.copy_(mels)
+            graph.replay()
+            # Static outputs are overwritten by the next replay
+            return static_outputs.clone()
+
+    def sample_subregions_parallel(self, mels, store_intermediate_states=False,
+                                   num_inference_steps=None, schedule='quadratic', max_batch_size=None,
+                                   use_cuda_graph=False):
         """
         Generation from mel-spectrogram by splitting inputs into several parts and processing them in paralell.
         Motivation is about the fact, that during training the model has seen only small segments of
@@ -147,20 +435,48 @@ class WaveGrad(BaseModule):
         Experiments have showed significant improvement in waveform generation using parallel generation.
         :param mels (torch.Tensor): mel-spectrograms acoustic features of shape [B, n_mels, T//hop_length]
         :param store_intermediate_states (bool, optional): whether to store dynamics trajectory or not
-        :return ys (list of torch.Tensor) (if store_intermediate_states=True)
+        :param num_inference_steps (int, optional): number of reverse iterations, see `sample` method
+        :param schedule (str, optional): reverse timesteps spacing, see `sample` method
+        :param max_batch_size (int, optional): maximum number of splits in a single network pass, see `sample_in_streams`
+        :param use_cuda_graph (bool, optional): replay captured CUDA graph of sampling, see `sample_graphed`
+        :return ys (torch.Tensor) of shape [num_inference_steps + 1, B, T] (if store_intermediate_states=True)
             or y_0 (torch.Tensor): predicted signals on every dynamics iteration of shape [B, T]
         """
         # @TODO: determine how to solve positional encoding issue
-        with torch.no_grad():
-            splits = mels.split(self.mel_segment_length, dim=-1)
-            recons = []
-            for split in splits:
-                outputs = self.sample(mels=split, store_intermediate_states=store_intermediate_states)
-                if store_intermediate_states:
-                    outputs = torch.stack(outputs)
-                recons.append(outputs)
-            final_outputs = torch.cat(recons, dim=-1)
-            return final_outputs
+        with torch.inference_mode():
+            batch_size, T = mels.shape[0], mels.shape[-1]
+            segment_length = min(self.mel_segment_length, T)
+            n_splits = -(-T // segment_length)
+
+            # Pad the last split and stack all the splits along batch dimension
+            # to process them with a single diffusion loop. Mels are log-scaled, so padding is filled
+            # with the lowest level of every utterance (silence) instead of zeros (unit amplitude)
+            pad_length = n_splits*segment_length - T
+            if pad_length > 0:
+                silence = mels.amin(dim=(1, 2), keepdim=True).expand(batch_size, mels.shape[1], pad_length)
+                mels = torch.cat([mels, silence], dim=-1)
+            mels = torch.cat(mels.split(segment_length, dim=-1), dim=0)
+            sampling_kwargs = {
+                'store_intermediate_states': store_intermediate_states,
+                'num_inference_steps': num_inference_steps,
+                'schedule': schedule
+            }
+            if use_cuda_graph:
+                assert not store_intermediate_states and isinstance(max_batch_size, type(None)), \
+                    """CUDA graphs sampling supports neither intermediate states nor batch size limit."""
+                outputs = self.sample_graphed(mels, num_inference_steps, schedule)
+            elif isinstance(max_batch_size, type(None)) or mels.shape[0] <= max_batch_size:
+                outputs = self.sample(mels=mels, **sampling_kwargs)
+            else:
+                outputs = self.sample_in_streams(mels, max_batch_size, **sampling_kwargs)
+            if not store_intermediate_states:
+                outputs = outputs[None]
+
+            # [n_states, n_splits*B, segment] -> [n_states, B, n_splits*segment]
+            n_states = outputs.shape[0]
+            outputs = outputs.view(n_states, n_splits, batch_size, -1).transpose(1, 2)
+            final_outputs = outputs.reshape(n_states, batch_size, -1)[..., :T*self.total_factor]
+            return final_outputs if store_intermediate_states else final_outputs[0]
 
     def compute_loss(self, mels, y_0):
         """
@@ -169,6 +485,12 @@ class WaveGrad(BaseModule):
         :param y_0 (torch.Tensor): GT speech signals
         :return loss (torch.Tensor): loss of diffusion model
         """
+        # Draw several noise levels per sample in one larger batch, so that a single
+        # forward/backward pass averages over them
+        if self.n_noise_levels_per_sample > 1:
+            mels = mels.repeat(self.n_noise_levels_per_sample, 1, 1)
+            y_0 = y_0.repeat(self.n_noise_levels_per_sample, 1)
+
         # Sample continious noise level
         batch_size = y_0.shape[0]
         continious_sqrt_alpha_cumprod \
@@ -180,10 +502,10 @@ class WaveGrad(BaseModule):
 
         # Reconstruct the added noise
         eps_recon = self.nn(mels, y_noisy, continious_sqrt_alpha_cumprod)
-        loss = torch.nn.L1Loss()(eps_recon, eps)
+        loss = torch.nn.functional.l1_loss(eps_recon, eps)
         return loss
 
-    def forward(self, mels, store_intermediate_states=False):
+    def forward(self, mels, store_intermediate_states=False, **kwargs):
         return self.sample_subregions_parallel(
-            mels, store_intermediate_states
+            mels, store_intermediate_states, **kwargs
         )
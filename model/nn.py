@@ -1,4 +1,4 @@
-import numpy as np
+import math
 
 import torch
 
@@ -82,7 +82,7 @@ class WaveGradNN(BaseModule):
             FiLM(
                 in_channels=in_size,
                 out_channels=out_size,
-                input_dscaled_by=np.product(film_factors[:i+1])  # for proper positional encodings initialization
+                input_dscaled_by=math.prod(film_factors[:i+1])  # for proper positional encodings initialization
             ) for i, (in_size, out_size) in enumerate(
                 zip(film_in_sizes, film_out_sizes)
             )
@@ -0,0 +1,110 @@
+import torch
+
+
+class WaveGradStreamer(object):
+    """
+    Stateful streaming synthesis with WaveGrad: mel-spectrogram frames are pushed as they arrive and
+    waveform is emitted by chunks of `chunk_size` frames. Every chunk is generated together with
+    `context_size` previous frames as left context and is crossfaded with the tail of the previous chunk
+    over `crossfade_length` samples to avoid clicks on chunks edges.
+    """
+    def __init__(self, model, chunk_size=5, context_size=2, crossfade_length=None, **sampling_kwargs):
+        """
+        :param model (WaveGrad): diffusion model to sample chunks with
+        :param chunk_size (int, optional): number of new mel frames generated on every step
+        :param context_size (int, optional): number of previous mel frames prepended to every chunk
+        :param crossfade_length (int, optional): crossfade length in samples, defaults to context duration
+        :param sampling_kwargs: keyword arguments of `model.sample` method (like `num_inference_steps`)
+        """
+        self.model = model
+        self.chunk_size = chunk_size
+        self.context_size = context_size
+        self.hop_length = model.total_factor
+        self.crossfade_length = context_size*self.hop_length \
+            if isinstance(crossfade_length, type(None)) else crossfade_length
+        assert 0 <= self.crossfade_length <= context_size*self.hop_length, \
+            """Crossfade should fit into the audio generated for left context frames."""
+        self.sampling_kwargs = sampling_kwargs
+        self.reset()
+
+    def reset(self):
+        self.pending_mels = None
+        self.context_mels = None
+        self.tail = None
+
+    def _crossfade(self, tail, head):
+        fade_in = torch.linspace(0, 1, steps=tail.shape[-1] + 2, device=tail.device)[1:-1]
+        return tail * (1 - fade_in) + head * fade_in
+
+    def _synthesize(self, mels):
+        """
+        Generates waveform for given new mel frames and returns its part which is ready to be emitted.
+        """
+        n_context = 0 if isinstance(self.context_mels, type(None)) else self.context_mels.shape[-1]
+        inputs = mels if n_context == 0 else torch.cat([self.context_mels, mels], dim=-1)
+        audio = self.model.sample(inputs, store_intermediate_states=False, **self.sampling_kwargs)
+        self.context_mels = inputs[..., -self.context_size:] if self.context_size > 0 else None
+
+        # Drop audio of context frames, except the part overlapping with the previous tail
+        start = n_context*self.hop_length
+        outputs = audio[..., start:]
+        if not isinstance(self.tail, type(None)) and self.tail.shape[-1] > 0:
+            overlap = self.tail.shape[-1]
+            head = audio[..., start - overlap:start]
+            outputs = torch.cat([self._crossfade(self.tail, head), outputs], dim=-1)
+
+        # Hold back the end of the chunk to crossfade it with the next one
+        split = outputs.shape[-1] - min(self.crossfade_length, audio.shape[-1] - start)
+        self.tail = outputs[..., split:]
+        return outputs[..., :split]
+
+    def push(self, mels, chunk_size=None):
+        """
+        Appends new mel frames and generates waveform for every full chunk of pending frames.
+        :param mels (torch.Tensor): mel-spectrogram frames of shape [B, n_mels, n_frames]
+        :param chunk_size (int, optional): number of mel frames generated on every step for this call,
+            defaults to `self.chunk_size`
+        :return (torch.Tensor): waveform ready to be played of shape [B, T] (might be empty)
+        """
+        chunk_size = self.chunk_size if isinstance(chunk_size, type(None)) else chunk_size
+        self.pending_mels = mels if isinstance(self.pending_mels, type(None)) \
+            else torch.cat([self.pending_mels, mels], dim=-1)
+        outputs = []
+        while self.pending_mels.shape[-1] >= chunk_size:
+            chunk = self.pending_mels[..., :chunk_size]
+            self.pending_mels = self.pending_mels[..., chunk_size:]
+            outputs.append(self._synthesize(chunk))
+        if len(outputs) == 0:
+            return mels.new_zeros(mels.shape[0], 0)
+        return torch.cat(outputs, dim=-1)
+
+    def flush(self):
+        """
+        Generates waveform for remaining pending frames and emits the held back tail.
+        :return (torch.Tensor): the rest of waveform of shape [B, T]
+        """
+        outputs = []
+        if not isinstance(self.pending_mels, type(None)) and self.pending_mels.shape[-1] > 0:
+            outputs.append(self._synthesize(self.pending_mels))
+        if not isinstance(self.tail, type(None)):
+            outputs.append(self.tail)
+        outputs = torch.cat(outputs, dim=-1) if len(outputs) > 0 else None
+        self.reset()
+        return outputs
+
+    def forward_in_chunks_iter(self, mel_stream, chunk_size=None):
+        """
+        Generates waveform from the stream of mel-spectrogram frames.
+        :param mel_stream (iterable of torch.Tensor): mel-spectrogram frames of shape [B, n_mels, n_frames]
+        :param chunk_size (int, optional): number of mel frames generated on every step of this stream,
+            defaults to `self.chunk_size` (which is left unchanged)
+        :return (generator of torch.Tensor): waveform chunks of shape [B, T]
+        """
+        self.reset()
+        for mels in mel_stream:
+            outputs = self.push(mels, chunk_size)
+            if outputs.shape[-1] > 0:
+                yield outputs
+        outputs = self.flush()
+        if not isinstance(outputs, type(None)) and outputs.shape[-1] > 0:
+            yield outputs
@@ -0,0 +1,58 @@
+import torch
+
+from model.base import BaseModule
+from model.diffusion_process import WaveGrad
+
+
+class TRTWaveGradNN(BaseModule):
+    """
+    Runs backbone network from serialized TensorRT engine, built from ONNX export of `WaveGradNN`
+    (see `export.py`). Follows the inputs and outputs signature of `WaveGradNN`.
+    Requires `tensorrt` package (TensorRT 10+ Python API).
+    """
+    def __init__(self, engine_path):
+        super(TRTWaveGradNN, self).__init__()
+        import tensorrt as trt
+
+        self.logger = trt.Logger(trt.Logger.WARNING)
+        with open(engine_path, 'rb') as f, trt.Runtime(self.logger) as runtime:
+            self.engine = runtime.deserialize_cuda_engine(f.read())
+        self.context = self.engine.create_execution_context()
+
+    def forward(self, mels, yn, noise_level):
+        """
+        Computes forward pass of TensorRT engine on the current CUDA stream.
+        :param mels (torch.Tensor): mel-spectrogram acoustic features of shape [B, n_mels, T//hop_length]
+        :param yn (torch.Tensor): noised signal `y_n` of shape [B, T]
+        :param noise_level (torch.Tensor): level of noise added by diffusion of shape [B, 1]
+        :return (torch.Tensor): epsilon noise
+        """
+        inputs = {'mels': mels, 'yn': yn, 'noise_level': noise_level}
+        # Engine reads raw device pointers, so inputs must be dense float32 tensors
+        inputs = {name: tensor.float().contiguous() for name, tensor in inputs.items()}
+        for name, tensor in inputs.items():
+            if not self.context.set_input_shape(name, tuple(tensor.shape)):
+                raise RuntimeError(
+                    f'TensorRT engine does not support `{name}` of shape {tuple(tensor.shape)}. '
+                    'Rebuild the engine with a shape profile covering it.'
+                )
+            self.context.set_tensor_address(name, tensor.data_ptr())
+        outputs = torch.empty(
+            tuple(self.context.get_tensor_shape('eps')), dtype=torch.float32, device=yn.device
+        )
+        self.context.set_tensor_address('eps', outputs.data_ptr())
+        if not self.context.execute_async_v3(torch.cuda.current_stream(yn.device).cuda_stream):
+            raise RuntimeError('TensorRT engine execution has failed.')
+        return outputs
+
+
+class TRTWaveGrad(WaveGrad):
+    """
+    WaveGrad diffusion process with backbone network running in TensorRT.
+    Light elementwise computations of reverse process are kept in PyTorch.
+    """
+    def __init__(self, config, engine_path):
+        super(TRTWaveGrad, self).__init__(config, nn=TRTWaveGradNN(engine_path))
+        # Engine precision is set when building it
+        self.mixed_precision_inference = False
+        self.compile_sampling = False
@@ -123,7 +123,7 @@ def run(config, args):
                             y_0_hat, generation_time, config.data_config.sample_rate
                         )
 
-                        test_l1_loss += torch.nn.L1Loss()(y_0_hat, test_sample).item()
+                        test_l1_loss += torch.nn.functional.l1_loss(y_0_hat, test_sample).item()
 
                         audios[f'audio_{index}/predicted'] = y_0_hat.cpu().squeeze()
                         specs[f'mel_{index}/predicted'] = mel_fn(y_0_hat).cpu().squeeze()